@@ -2,10 +2,14 @@
 import streamlit as st
 import os
 import time
+import asyncio
+import hashlib
+import re
+import threading
+import uuid
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
-from rag_chain import WindchillRAG
 from datetime import datetime, timedelta
-import pandas as pd
 
 load_dotenv()
 
@@ -17,54 +21,125 @@ st.set_page_config(
 )
 
 # Custom CSS
-st.markdown("""
-<style>
+CUSTOM_CSS = """
     .main-header {
         font-size: 2.5rem;
         color: #1f77b4;
         text-align: center;
         margin-bottom: 2rem;
     }
-    .log-entry {
-        background-color: #f0f2f6;
-        padding: 10px;
-        border-radius: 5px;
-        margin: 5px 0;
-        font-family: monospace;
-        font-size: 0.9em;
-    }
-    .error-log { border-left: 4px solid #ff4b4b; }
-    .warning-log { border-left: 4px solid #ffa500; }
-    .info-log { border-left: 4px solid #1f77b4; }
-    .http-log { border-left: 4px solid #2e8b57; }
-    .windchill-log { border-left: 4px solid #9370db; }
-    .source-badge {
-        display: inline-block;
-        padding: 2px 8px;
-        border-radius: 12px;
-        font-size: 0.7em;
-        font-weight: bold;
-        margin-right: 8px;
-        color: white;
-    }
-    .http-badge { background-color: #2e8b57; }
-    .windchill-badge { background-color: #9370db; }
     .issue-critical { background-color: #ffebee; border-left: 4px solid #d32f2f; }
     .issue-high { background-color: #fff3e0; border-left: 4px solid #f57c00; }
     .issue-medium { background-color: #f3e5f5; border-left: 4px solid #7b1fa2; }
     .issue-low { background-color: #e8f5e8; border-left: 4px solid #388e3c; }
-</style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource
+def minified_css() -> str:
+    """Collapse whitespace in the custom CSS once per process"""
+    return re.sub(r"\s+", " ", CUSTOM_CSS).strip()
+
+def inject_css():
+    """Inject the custom CSS without going through the markdown parser"""
+    st.html(f"<style>{minified_css()}</style>")
+
+# Response cache settings (shared by all sessions through the cached chatbot)
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))  # seconds
+
+# Chat history bounds
+MAX_CHAT_MESSAGES = 100  # last 50 question/answer turns per session
+DOCUMENT_STORE_MAX_ENTRIES = int(os.getenv("DOCUMENT_STORE_MAX_ENTRIES", "5000"))
+
+# Pre-defined queries for quick actions
+QUICK_ACTION_QUERIES = {
+    "critical_errors": "Show me critical errors that need immediate attention with remediation steps and root cause analysis",
+    "performance": "Identify performance bottlenecks, slow endpoints, and suggest specific optimizations with estimated impact", 
+    "security": "Find security-related issues, authentication problems, and recommend security improvements"
+}
+
+# Sidebar sample questions per log type
+SAMPLE_QUESTIONS = {
+    "combined": [
+        "Show me recent errors and their HTTP requests",
+        "Correlate application errors with HTTP response times",
+        "Analyze system performance across both log types",
+        "Find patterns between slow requests and application errors"
+    ],
+    "windchill": [
+        "Show me recent error logs from Application Insights",
+        "What are the most common error patterns?",
+        "Analyze performance issues from the application logs",
+        "What modules are generating the most errors?"
+    ],
+    "http": [
+        "Show me slow HTTP requests (high response time)",
+        "What are the most frequently accessed endpoints?",
+        "Analyze HTTP error patterns (4xx, 5xx status codes)",
+        "Show requests by client IP addresses"
+    ]
+}
 
 class WindchillChatbot:
     def __init__(self):
+        self._response_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.quick_action_docs = {}
+        self.sample_question_vectors = {}
         try:
+            # Imported lazily: rag_chain pulls in FAISS and LangChain
+            from rag_chain import WindchillRAG
             self.rag = WindchillRAG()
             self.initialized = True
             self.error_message = None
         except Exception as e:
             self.initialized = False
             self.error_message = str(e)
+            return
+        
+        self._prefetch_quick_actions()
+        self._embed_sample_questions()
+    
+    def _prefetch_quick_actions(self):
+        """Embed all quick-action queries at once and retrieve their documents in one batched search"""
+        try:
+            actions = list(QUICK_ACTION_QUERIES)
+            vectors = self.rag.embeddings.embed_documents([QUICK_ACTION_QUERIES[a] for a in actions])
+            self.quick_action_docs = dict(zip(actions, self.rag.batch_search(vectors, k=5)))
+        except Exception as e:
+            # Quick actions fall back to the regular query path
+            print(f"⚠️ Could not prefetch quick action documents: {e}")
+            self.quick_action_docs = {}
+    
+    def _embed_sample_questions(self):
+        """Embed the fixed sidebar questions once so clicking one skips the embedding call"""
+        try:
+            questions = [q for qs in SAMPLE_QUESTIONS.values() for q in qs]
+            vectors = self.rag.embeddings.embed_documents(questions)
+            self.sample_question_vectors = dict(zip(questions, vectors))
+        except Exception as e:
+            print(f"⚠️ Could not embed sample questions: {e}")
+            self.sample_question_vectors = {}
+   
+    def get_quick_action_response(self, action: str):
+        """Answer a quick action using the documents retrieved at startup"""
+        query = QUICK_ACTION_QUERIES.get(action, "Analyze system issues and provide actionable recommendations")
+        if not self.initialized or action not in self.quick_action_docs:
+            return self.get_response(query, "combined")
+        
+        key = (query.strip().lower(), "combined")
+        cached = self._get_cached_response(key)
+        if cached is not None:
+            return cached
+        
+        windchill_docs, http_docs = self.quick_action_docs[action]
+        with st.spinner("Analyzing combined logs..."):
+            result = self.rag.query_with_documents(query, windchill_docs, http_docs)
+        
+        if result.get("source_documents"):
+            self._cache_response(key, result)
+        
+        return result
    
     def get_response(self, question: str, log_type: str = "combined"):
         """Get response from RAG system with log type selection"""
@@ -75,172 +150,311 @@ class WindchillChatbot:
                 "log_type": log_type
             }
         
+        key = (question.strip().lower(), log_type)
+        cached = self._get_cached_response(key)
+        if cached is not None:
+            return cached
+        
+        vector = self.sample_question_vectors.get(question)
         with st.spinner(f"Analyzing {log_type} logs..."):
-            result = self.rag.query(question, log_type)
+            if vector is not None:
+                result = self.rag.query_with_vector(question, vector, log_type)
+            else:
+                result = self.rag.query(question, log_type)
+        
+        # Only cache real answers; errors come back without source documents
+        if result.get("source_documents"):
+            self._cache_response(key, result)
        
         return result
+    
+    def stream_response(self, question: str, log_type: str = "combined"):
+        """Render the answer in the current container as it streams and return the full response"""
+        key = (question.strip().lower(), log_type)
+        if not self.initialized or self._get_cached_response(key) is not None:
+            result = self.get_response(question, log_type)
+            st.markdown(result["result"])
+            return result
+        
+        try:
+            with st.spinner(f"Searching {log_type} logs..."):
+                source_docs, tokens = self.rag.stream(
+                    question, log_type, self.sample_question_vectors.get(question)
+                )
+            text = st.write_stream(tokens)
+        except Exception as e:
+            result = {
+                "result": f"Error processing query: {str(e)}",
+                "source_documents": [],
+                "log_type": log_type
+            }
+            st.markdown(result["result"])
+            return result
+        
+        result = {
+            "result": text,
+            "source_documents": source_docs,
+            "log_type": log_type
+        }
+        
+        if source_docs:
+            self._cache_response(key, result)
+        
+        return result
+    
+    def _get_cached_response(self, key):
+        """Return a cached response if present and not expired"""
+        with self._cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is None:
+                return None
+            timestamp, result = entry
+            if time.monotonic() - timestamp > RESPONSE_CACHE_TTL:
+                del self._response_cache[key]
+                return None
+            self._response_cache.move_to_end(key)
+            return result
+    
+    def _cache_response(self, key, result):
+        """Store a response, evicting the least recently used entry when full"""
+        with self._cache_lock:
+            self._response_cache[key] = (time.monotonic(), result)
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > RESPONSE_CACHE_MAX_ENTRIES:
+                self._response_cache.popitem(last=False)
+
+class DocumentStore:
+    """Process-wide store of source documents; chat history only keeps their ids"""
+    def __init__(self, max_entries: int = DOCUMENT_STORE_MAX_ENTRIES):
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+    
+    def put(self, documents):
+        """Store documents and return their ids"""
+        ids = [uuid.uuid4().hex for _ in documents]
+        with self._lock:
+            self._docs.update(zip(ids, documents))
+            while len(self._docs) > self.max_entries:
+                self._docs.popitem(last=False)
+        return ids
+    
+    def get(self, ids):
+        """Return the documents that are still stored for the given ids"""
+        with self._lock:
+            return [self._docs[i] for i in ids if i in self._docs]
+
+@st.cache_resource
+def get_document_store():
+    """Share one document store across sessions and reruns"""
+    return DocumentStore()
+
+@st.cache_resource(show_spinner="Loading FAISS indexes...")
+def get_chatbot():
+    """Create the chatbot once per worker process and share it across sessions"""
+    return WindchillChatbot()
 
-def format_source_document(source, index: int):
-    """Format a source document for display with appropriate styling"""
+# Metadata shown for each source type as (label, metadata key)
+HTTP_SOURCE_FIELDS = (
+    ("Method", "method"),
+    ("URL", "url"),
+    ("Status", "status"),
+    ("Response Time (ms)", "response_time"),
+    ("Client IP", "client_ip"),
+    ("Timestamp", "timestamp"),
+)
+WINDCHILL_SOURCE_FIELDS = (
+    ("Time", "time"),
+    ("Module", "module"),
+)
+
+# (badge, level colour, fields, missing-value text) per (source type, level), built once at import
+SOURCE_STYLES = {
+    (source_type, level): (badge, level_color, fields, default)
+    for source_type, (badge, fields, default) in {
+        "http_log": (":green-background[**HTTP**]", HTTP_SOURCE_FIELDS, "N/A"),
+        "windchill_log": (":violet-background[**WINCHILL**]", WINDCHILL_SOURCE_FIELDS, "Unknown"),
+    }.items()
+    for level, level_color in {"ERROR": "red", "WARNING": "orange", "INFO": "blue"}.items()
+}
+DEFAULT_SOURCE_STYLE = SOURCE_STYLES[("windchill_log", "INFO")]
+
+def widget_key(prefix: str, text: str) -> str:
+    """Stable widget key derived from the widget's content rather than its position"""
+    return f"{prefix}_{hashlib.blake2b(text.encode(), digest_size=6).hexdigest()}"
+
+def truncate(text: str, limit: int) -> str:
+    """Shorten text to limit characters, adding an ellipsis only when something was cut"""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def render_source_document(source, index: int):
+    """Render a source document with native Streamlit components"""
     source_type = source.metadata.get('source_type', 'windchill_log')
     log_level = source.metadata.get('level', 'INFO').upper()
     
-    # Determine CSS class based on log type and level
-    if source_type == 'http_log':
-        css_class = "http-log"
-        badge_class = "http-badge"
-        badge_text = "HTTP"
-    else:
-        css_class = "windchill-log" 
-        badge_class = "windchill-badge"
-        badge_text = "WINCHILL"
-    
-    # Add level-based styling
-    if log_level == 'ERROR':
-        css_class += " error-log"
-    elif log_level == 'WARNING':
-        css_class += " warning-log"
-    else:
-        css_class += " info-log"
-    
-    # Format content based on source type
-    if source_type == 'http_log':
-        content = f"""
-        <strong>Method:</strong> {source.metadata.get('method', 'N/A')} | 
-        <strong>URL:</strong> {source.metadata.get('url', 'N/A')} | 
-        <strong>Status:</strong> {source.metadata.get('status', 'N/A')} | 
-        <strong>Response Time:</strong> {source.metadata.get('response_time', 'N/A')}ms
-        <br><strong>Client IP:</strong> {source.metadata.get('client_ip', 'N/A')} | 
-        <strong>Timestamp:</strong> {source.metadata.get('timestamp', 'N/A')}
-        """
-        preview = source.page_content[:300] + "..." if len(source.page_content) > 300 else source.page_content
-    else:
-        content = f"""
-        <strong>Time:</strong> {source.metadata.get('time', 'Unknown')} | 
-        <strong>Module:</strong> {source.metadata.get('module', 'Unknown')} | 
-        <strong>Level:</strong> {log_level}
-        """
-        preview = source.page_content[:300] + "..." if len(source.page_content) > 300 else source.page_content
+    # Other levels are styled like INFO for their source type
+    style = SOURCE_STYLES.get((source_type, log_level)) or SOURCE_STYLES.get((source_type, 'INFO'), DEFAULT_SOURCE_STYLE)
+    badge, level_color, fields, default = style
     
-    return f'''
-    <div class="log-entry {css_class}">
-        <span class="source-badge {badge_class}">{badge_text}</span>
-        <span class="source-badge" style="background-color: #666;">#{index + 1}</span>
-        {content}
-        <br>
-        <strong>Content:</strong> {preview}
-    </div>
-    '''
+    preview = truncate(source.page_content, 300)
+    
+    with st.container(border=True):
+        st.markdown(f"{badge} :gray-background[**#{index + 1}**] :{level_color}[**{log_level}**]")
+        st.caption(" | ".join(f"**{label}:** {source.metadata.get(key, default)}" for label, key in fields))
+        st.code(preview, language=None)
 
+# Index locations (environment does not change while the app runs)
+WINDCHILL_INDEX_FILE = os.path.join(os.getenv("FAISS_INDEX_PATH", "faiss_windchill_index"), "index.faiss")
+HTTP_INDEX_FILE = os.path.join(os.getenv("FAISS_HTTP_INDEX_PATH", "faiss_http_index"), "index.faiss")
+
+@st.cache_data(ttl=30, show_spinner=False)
 def check_index_files():
     """Check if the required index files exist"""
-    windchill_index_path = os.getenv("FAISS_INDEX_PATH", "faiss_windchill_index")
-    http_index_path = os.getenv("FAISS_HTTP_INDEX_PATH", "faiss_http_index")
-    
-    windchill_exists = os.path.exists(windchill_index_path) and os.path.exists(os.path.join(windchill_index_path, "index.faiss"))
-    http_exists = os.path.exists(http_index_path) and os.path.exists(os.path.join(http_index_path, "index.faiss"))
+    # A missing folder also means a missing index.faiss, so one stat per index is enough
+    windchill_exists = os.path.exists(WINDCHILL_INDEX_FILE)
+    http_exists = os.path.exists(HTTP_INDEX_FILE)
     
     return windchill_exists, http_exists
 
+# Priority levels, normalized once when remediation data is produced
+PRIORITY_LOW, PRIORITY_MEDIUM, PRIORITY_HIGH, PRIORITY_CRITICAL = range(4)
+
+# CSS class for each priority level, indexed by priority_level
+PRIORITY_CLASS = ("issue-low", "issue-medium", "issue-high", "issue-critical")
+
+# Sample remediation data - in real implementation, this would come from AI analysis
+REMEDIATION_DATA = [
+    {
+        "issue": "High Database Connection Timeouts",
+        "priority": "🚨 CRITICAL",
+        "priority_level": PRIORITY_CRITICAL,
+        "frequency": "45 occurrences in 24h",
+        "quick_fix": "Increase connection pool size from 50 to 100",
+        "detailed_fix": "Update database configuration and implement connection retry logic",
+        "impact": "User login failures, data sync issues",
+        "estimated_time": "2-4 hours",
+        "category": "Database"
+    },
+    {
+        "issue": "Slow API Response Times", 
+        "priority": "⚠️ HIGH",
+        "priority_level": PRIORITY_HIGH,
+        "frequency": "23 slow requests (>5s)",
+        "quick_fix": "Add caching for frequent API calls",
+        "detailed_fix": "Implement Redis cache for user session data and frequent queries",
+        "impact": "Poor user experience, timeout errors",
+        "estimated_time": "3-5 hours",
+        "category": "Performance"
+    },
+    {
+        "issue": "Memory Leak in User Module",
+        "priority": "🚨 CRITICAL",
+        "priority_level": PRIORITY_CRITICAL,
+        "frequency": "Memory spikes every 2 hours",
+        "quick_fix": "Restart affected service during low traffic",
+        "detailed_fix": "Profile memory usage and fix object retention in user session handling",
+        "impact": "Service crashes, performance degradation",
+        "estimated_time": "4-6 hours",
+        "category": "Memory"
+    },
+    {
+        "issue": "404 Errors on Static Assets",
+        "priority": "✅ LOW",
+        "priority_level": PRIORITY_LOW,
+        "frequency": "12% of static requests failing",
+        "quick_fix": "Check CDN configuration and file permissions",
+        "detailed_fix": "Verify asset paths and update load balancer rules",
+        "impact": "Broken UI elements, missing images",
+        "estimated_time": "1-2 hours",
+        "category": "Configuration"
+    }
+]
+
+@st.cache_data(show_spinner=False)
+def render_issue_html(issue_items: tuple) -> str:
+    """Render the static details of a remediation issue (memoized per issue)"""
+    issue = dict(issue_items)
+    priority_class = PRIORITY_CLASS[issue['priority_level']]
+    return f'''
+    <div class="{priority_class}" style="padding: 10px; border-radius: 5px; margin: 5px 0;">
+        <strong>Category:</strong> {issue['category']}<br>
+        <strong>Frequency:</strong> {issue['frequency']}<br>
+        <strong>Estimated Time:</strong> {issue['estimated_time']}<br>
+        <strong>Impact:</strong> {issue['impact']}
+    </div>
+    '''
+
+@st.cache_data(show_spinner=False)
+def remediation_csv_bytes(issue_rows: tuple) -> bytes:
+    """Encode the remediation report as UTF-8 CSV (memoized per report contents)"""
+    import pandas as pd
+    return pd.DataFrame([dict(row) for row in issue_rows]).to_csv(index=False).encode("utf-8")
+
 def generate_remediation_report(chatbot):
     """Generate a simple remediation report with common fixes"""
     
     st.header("📋 Quick Fix Recommendations")
     st.info("Based on recent log analysis, here are the top issues to address:")
     
-    # Sample remediation data - in real implementation, this would come from AI analysis
-    remediation_data = [
-        {
-            "issue": "High Database Connection Timeouts",
-            "priority": "🚨 CRITICAL",
-            "frequency": "45 occurrences in 24h",
-            "quick_fix": "Increase connection pool size from 50 to 100",
-            "detailed_fix": "Update database configuration and implement connection retry logic",
-            "impact": "User login failures, data sync issues",
-            "estimated_time": "2-4 hours",
-            "category": "Database"
-        },
-        {
-            "issue": "Slow API Response Times", 
-            "priority": "⚠️ HIGH",
-            "frequency": "23 slow requests (>5s)",
-            "quick_fix": "Add caching for frequent API calls",
-            "detailed_fix": "Implement Redis cache for user session data and frequent queries",
-            "impact": "Poor user experience, timeout errors",
-            "estimated_time": "3-5 hours",
-            "category": "Performance"
-        },
-        {
-            "issue": "Memory Leak in User Module",
-            "priority": "🚨 CRITICAL",
-            "frequency": "Memory spikes every 2 hours",
-            "quick_fix": "Restart affected service during low traffic",
-            "detailed_fix": "Profile memory usage and fix object retention in user session handling",
-            "impact": "Service crashes, performance degradation",
-            "estimated_time": "4-6 hours",
-            "category": "Memory"
-        },
-        {
-            "issue": "404 Errors on Static Assets",
-            "priority": "✅ LOW",
-            "frequency": "12% of static requests failing",
-            "quick_fix": "Check CDN configuration and file permissions",
-            "detailed_fix": "Verify asset paths and update load balancer rules",
-            "impact": "Broken UI elements, missing images",
-            "estimated_time": "1-2 hours",
-            "category": "Configuration"
-        }
-    ]
+    remediation_data = REMEDIATION_DATA
     
     # Display issues in a clean format
     for i, issue in enumerate(remediation_data, 1):
-        # Determine CSS class based on priority
-        priority_class = ""
-        if "CRITICAL" in issue['priority']:
-            priority_class = "issue-critical"
-        elif "HIGH" in issue['priority']:
-            priority_class = "issue-high"
-        elif "MEDIUM" in issue['priority']:
-            priority_class = "issue-medium"
-        else:
-            priority_class = "issue-low"
-        
         with st.expander(f"{i}. {issue['issue']} - {issue['priority']}", expanded=(i == 1)):
-            st.markdown(f'<div class="{priority_class}" style="padding: 10px; border-radius: 5px; margin: 5px 0;">', unsafe_allow_html=True)
-            
             col1, col2 = st.columns([1, 2])
             
             with col1:
-                st.write(f"**Category:** {issue['category']}")
-                st.write(f"**Frequency:** {issue['frequency']}")
-                st.write(f"**Estimated Time:** {issue['estimated_time']}")
-                st.write(f"**Impact:** {issue['impact']}")
+                st.markdown(render_issue_html(tuple(issue.items())), unsafe_allow_html=True)
             
             with col2:
                 st.success(f"**Quick Fix:** {issue['quick_fix']}")
                 st.info(f"**Detailed Solution:** {issue['detailed_fix']}")
-                
-                # Add action buttons
-                cola, colb, colc = st.columns(3)
-                with cola:
-                    if st.button("📝 Create Ticket", key=f"ticket_{i}"):
-                        st.success("Ticket created for this issue!")
-                with colb:
-                    if st.button("✅ Mark as Fixed", key=f"fixed_{i}"):
-                        st.success("Issue marked as resolved!")
-                with colc:
-                    if st.button("🔍 Analyze Logs", key=f"analyze_{i}"):
-                        st.session_state.analyze_issue = issue['issue']
-            
-            st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Issue actions in a single widget instead of three buttons per issue
+    st.subheader("✅ Issue Actions")
+    actions = st.data_editor(
+        [
+            {
+                "Issue": issue['issue'],
+                "Priority": issue['priority'],
+                "Create Ticket": False,
+                "Mark as Fixed": False,
+                "Analyze Logs": False
+            }
+            for issue in remediation_data
+        ],
+        column_config={
+            "Create Ticket": st.column_config.CheckboxColumn("📝 Create Ticket"),
+            "Mark as Fixed": st.column_config.CheckboxColumn("✅ Mark as Fixed"),
+            "Analyze Logs": st.column_config.CheckboxColumn("🔍 Analyze Logs")
+        },
+        disabled=["Issue", "Priority"],
+        hide_index=True,
+        use_container_width=True,
+        key="remediation_actions"
+    )
+    
+    for row in actions:
+        if row["Create Ticket"]:
+            st.success(f"Ticket created for: {row['Issue']}")
+        if row["Mark as Fixed"]:
+            st.success(f"Issue marked as resolved: {row['Issue']}")
+        if row["Analyze Logs"]:
+            st.session_state.analyze_issue = row['Issue']
     
     # Summary statistics
     st.subheader("📊 Report Summary")
     col1, col2, col3, col4 = st.columns(4)
     
-    total_issues = len(remediation_data)
-    critical_issues = len([i for i in remediation_data if "CRITICAL" in i['priority']])
-    high_issues = len([i for i in remediation_data if "HIGH" in i['priority']])
+    # Columnar view of the report for the summary statistics
+    import pandas as pd
+    df = pd.DataFrame(remediation_data)
+    priority_counts = df['priority_level'].value_counts()
+    
+    total_issues = len(df)
+    critical_issues = int(priority_counts.get(PRIORITY_CRITICAL, 0))
+    high_issues = int(priority_counts.get(PRIORITY_HIGH, 0))
+    total_time = int(df['estimated_time'].str.split('-').str[0].astype(int).sum())
     
     with col1:
         st.metric("Total Issues", total_issues)
@@ -249,7 +463,6 @@ def generate_remediation_report(chatbot):
     with col3:
         st.metric("High Priority", high_issues)
     with col4:
-        total_time = sum([int(issue['estimated_time'].split('-')[0]) for issue in remediation_data])
         st.metric("Total Fix Time", f"{total_time}+ hours")
     
     # Export options
@@ -263,12 +476,12 @@ def generate_remediation_report(chatbot):
     
     with col2:
         if st.button("📊 Export to CSV"):
-            # Create DataFrame and export
-            df = pd.DataFrame(remediation_data)
-            csv = df.to_csv(index=False)
             st.download_button(
                 label="Download CSV",
-                data=csv,
+                # priority_level is an internal sort/style key, not an export column
+                data=remediation_csv_bytes(tuple(
+                    tuple((k, v) for k, v in issue.items() if k != "priority_level") for issue in remediation_data
+                )),
                 file_name="windchill_issues.csv",
                 mime="text/csv"
             )
@@ -277,6 +490,43 @@ def generate_remediation_report(chatbot):
         if st.button("🔄 Refresh Report"):
             st.rerun()
 
+# Simulated deep analysis output - in real implementation, this would come from your AI
+DEEP_ANALYSIS_PATTERNS_MD = """
+- **Database issues** correlate with user login spikes (9-11 AM)
+- **Memory leaks** occur after 4+ hours of continuous operation  
+- **API slowdowns** happen during bulk data operations
+- **Error rates** increase by 45% during peak hours
+"""
+
+DEEP_ANALYSIS_RECOMMENDATIONS_MD = """
+- **Scale database resources** during 9-11 AM peak hours
+- **Implement service recycling** every 3 hours for memory management
+- **Add request throttling** for bulk operations
+- **Monitor error rates** with real-time alerts
+"""
+
+DEEP_ANALYSIS_ACTION_PLAN_MD = """
+1. **Immediate (Today):**
+   - Increase database connection pool to 150
+   - Set up memory monitoring alerts
+
+2. **Short-term (This Week):**
+   - Implement Redis caching layer
+   - Add circuit breaker pattern for API calls
+
+3. **Long-term (This Month):**
+   - Database performance tuning
+   - Implement auto-scaling for peak loads
+"""
+
+async def run_deep_analysis():
+    """Run the deep analysis and return (patterns, recommendations, action plan) markdown"""
+    # Simulate AI analysis - in real implementation, await the AI call here,
+    # e.g. await asyncio.to_thread(chatbot.rag.generate_remediation_report)
+    await asyncio.sleep(3)
+    return DEEP_ANALYSIS_PATTERNS_MD, DEEP_ANALYSIS_RECOMMENDATIONS_MD, DEEP_ANALYSIS_ACTION_PLAN_MD
+
+@st.fragment
 def show_remediation_dashboard(chatbot):
     """Main remediation dashboard function"""
     
@@ -293,48 +543,24 @@ def show_remediation_dashboard(chatbot):
     st.subheader("🔍 AI-Powered Deep Analysis")
     
     if st.button("🤖 Run Advanced Analysis", type="primary"):
-        with st.spinner("AI is analyzing logs for deeper insights and correlations..."):
-            # Simulate AI analysis - in real implementation, this would call your AI
-            time.sleep(3)
-            
-            st.success("✅ Deep analysis completed!")
-            
-            # Display AI insights
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("📈 Pattern Detection")
-                st.write("""
-                - **Database issues** correlate with user login spikes (9-11 AM)
-                - **Memory leaks** occur after 4+ hours of continuous operation  
-                - **API slowdowns** happen during bulk data operations
-                - **Error rates** increase by 45% during peak hours
-                """)
-            
-            with col2:
-                st.subheader("🎯 Recommendations")
-                st.write("""
-                - **Scale database resources** during 9-11 AM peak hours
-                - **Implement service recycling** every 3 hours for memory management
-                - **Add request throttling** for bulk operations
-                - **Monitor error rates** with real-time alerts
-                """)
-            
-            # Show AI-generated action plan
-            with st.expander("📋 AI-Generated Action Plan", expanded=True):
-                st.write("""
-                1. **Immediate (Today):**
-                   - Increase database connection pool to 150
-                   - Set up memory monitoring alerts
-                
-                2. **Short-term (This Week):**
-                   - Implement Redis caching layer
-                   - Add circuit breaker pattern for API calls
-                
-                3. **Long-term (This Month):**
-                   - Database performance tuning
-                   - Implement auto-scaling for peak loads
-                """)
+        with st.status("AI is analyzing logs for deeper insights and correlations...") as status:
+            patterns, recommendations, action_plan = asyncio.run(run_deep_analysis())
+            status.update(label="✅ Deep analysis completed!", state="complete")
+        
+        # Display AI insights
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("📈 Pattern Detection")
+            st.markdown(patterns)
+        
+        with col2:
+            st.subheader("🎯 Recommendations")
+            st.markdown(recommendations)
+        
+        # Show AI-generated action plan
+        with st.expander("📋 AI-Generated Action Plan", expanded=True):
+            st.markdown(action_plan)
 
 def handle_quick_action(action, chatbot):
     """Handle quick action buttons"""
@@ -347,18 +573,9 @@ def handle_quick_action(action, chatbot):
     
     st.header(f"⚡ {action_titles.get(action, 'Quick Analysis')}")
     
-    # Pre-defined queries for quick actions
-    action_queries = {
-        "critical_errors": "Show me critical errors that need immediate attention with remediation steps and root cause analysis",
-        "performance": "Identify performance bottlenecks, slow endpoints, and suggest specific optimizations with estimated impact", 
-        "security": "Find security-related issues, authentication problems, and recommend security improvements"
-    }
-    
-    query = action_queries.get(action, "Analyze system issues and provide actionable recommendations")
-    
     # Use combined logs for better analysis
     with st.spinner(f"Analyzing {action.replace('_', ' ')}..."):
-        response = chatbot.get_response(query, "combined")
+        response = chatbot.get_quick_action_response(action)
     
     st.subheader("Analysis Results")
     st.write(response["result"])
@@ -367,7 +584,7 @@ def handle_quick_action(action, chatbot):
     if response.get("source_documents"):
         with st.expander("📎 Supporting Log Evidence", expanded=False):
             for i, source in enumerate(response["source_documents"][:3]):
-                st.markdown(f"**Evidence {i+1}:** {source.page_content[:200]}...")
+                st.markdown(f"**Evidence {i+1}:** {truncate(source.page_content, 200)}")
     
     # Add quick remediation suggestions
     st.subheader("💡 Recommended Immediate Actions")
@@ -409,6 +626,7 @@ def show_security_actions():
     - 🔍 **Scan**: Run security vulnerability assessment
     """)
 
+@st.fragment
 def show_chat_interface(chatbot):
     """Show the main chat interface"""
     col1, col2 = st.columns([2, 1])
@@ -421,14 +639,19 @@ def show_chat_interface(chatbot):
             with st.chat_message(message["role"]):
                 st.markdown(message["content"])
                
-                # Show source documents if available
-                if message.get("sources"):
-                    with st.expander(f"📎 Source Logs ({len(message['sources'])} entries)"):
-                        for i, source in enumerate(message["sources"][:3]):
-                            st.markdown(format_source_document(source, i), unsafe_allow_html=True)
+                # Show source documents if available; the shared store may have evicted some of them
+                sources = get_document_store().get(message.get("source_ids", ()))
+                if sources:
+                    with st.expander(f"📎 Source Logs ({len(sources)} entries)"):
+                        for i, source in enumerate(sources):
+                            render_source_document(source, i)
        
         # User input
         user_input = st.chat_input("Ask about Windchill logs or HTTP access logs...")
+        
+        # Fall back to a sample question picked in the sidebar
+        if not user_input:
+            user_input = st.session_state.pop("user_input", None)
        
         if user_input:
             # Add user message to chat history
@@ -438,23 +661,21 @@ def show_chat_interface(chatbot):
             with st.chat_message("user"):
                 st.markdown(user_input)
            
-            # Get bot response
-            response = chatbot.get_response(user_input, st.session_state.log_type)
-           
-            # Add assistant response to chat history
+            # Add assistant response to chat history, streaming tokens as they arrive
             with st.chat_message("assistant"):
-                st.markdown(response["result"])
+                response = chatbot.stream_response(user_input, st.session_state.log_type)
                
                 # Display source documents
                 if response.get("source_documents"):
                     with st.expander(f"📎 Relevant Log Entries ({len(response['source_documents'])} found)"):
                         for i, source in enumerate(response["source_documents"][:3]):
-                            st.markdown(format_source_document(source, i), unsafe_allow_html=True)
+                            render_source_document(source, i)
            
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": response["result"],
-                "sources": response.get("source_documents", []),
+                # History only ever renders the top three sources, so store just those
+                "source_ids": get_document_store().put(response.get("source_documents", [])[:3]),
                 "log_type": response.get("log_type", "combined")
             })
    
@@ -479,7 +700,7 @@ def show_chat_interface(chatbot):
                 if st.button("📊 Error Patterns", key="patterns_btn"):
                     query = "What are the most common error patterns and their frequencies?"
                     response = chatbot.get_response(query, "windchill")
-                    st.info(response["result"][:200] + "..." if len(response["result"]) > 200 else response["result"])
+                    st.info(truncate(response["result"], 200))
                     
             else:  # http logs
                 if st.button("🐌 Slow Requests", key="slow_btn"):
@@ -488,7 +709,7 @@ def show_chat_interface(chatbot):
                 if st.button("❌ HTTP Errors", key="http_errors_btn"):
                     query = "Show HTTP errors with status codes and remediation suggestions"
                     response = chatbot.get_response(query, "http")
-                    st.info(response["result"][:200] + "..." if len(response["result"]) > 200 else response["result"])
+                    st.info(truncate(response["result"], 200))
         
         st.subheader("🎯 Analysis Tips")
         
@@ -500,6 +721,7 @@ def show_chat_interface(chatbot):
             st.info("💡 Monitor response times, status codes, and endpoint performance")
 
 def main():
+    inject_css()
     st.markdown('<div class="main-header">🤖 Windchill Log Analysis Assistant</div>', unsafe_allow_html=True)
     st.markdown('<div style="text-align: center; color: #666; margin-bottom: 2rem;">Analyzing Windchill Application Logs & HTTP Access Logs</div>', unsafe_allow_html=True)
    
@@ -526,12 +748,13 @@ def main():
         else:
             st.warning("📊 Both Indexes: ⚠️ Some missing")
     
-    # Initialize chatbot
-    if 'chatbot' not in st.session_state:
-        st.session_state.chatbot = WindchillChatbot()
+    # Initialize chatbot (shared across sessions; retry on next rerun if loading failed)
+    chatbot = get_chatbot()
+    if not chatbot.initialized:
+        get_chatbot.clear()
    
     if 'messages' not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
     
     if 'log_type' not in st.session_state:
         st.session_state.log_type = "combined"
@@ -562,31 +785,16 @@ def main():
         st.subheader("💡 Sample Questions")
         
         # Dynamic sample questions based on log type
-        if st.session_state.log_type == "combined":
-            sample_questions = [
-                "Show me recent errors and their HTTP requests",
-                "Correlate application errors with HTTP response times",
-                "Analyze system performance across both log types",
-                "Find patterns between slow requests and application errors"
-            ]
-        elif st.session_state.log_type == "windchill":
-            sample_questions = [
-                "Show me recent error logs from Application Insights",
-                "What are the most common error patterns?",
-                "Analyze performance issues from the application logs",
-                "What modules are generating the most errors?"
-            ]
-        else:  # http logs
-            sample_questions = [
-                "Show me slow HTTP requests (high response time)",
-                "What are the most frequently accessed endpoints?",
-                "Analyze HTTP error patterns (4xx, 5xx status codes)",
-                "Show requests by client IP addresses"
-            ]
+        sample_questions = SAMPLE_QUESTIONS[st.session_state.log_type]
        
-        for i, question in enumerate(sample_questions):
-            if st.button(question, key=f"sample_{i}"):
+        for question in sample_questions:
+            if st.button(question, key=widget_key("sample", question)):
+                # Only the chat view consumes user_input, so switch to it; otherwise the question lingers
+                # and fires unexpectedly when the user later returns to chat
                 st.session_state.user_input = question
+                st.session_state.show_remediation = False
+                st.session_state.quick_action = None
+                st.session_state.show_chat = True
        
         # Remediation Tools Section
         st.markdown("---")
@@ -630,18 +838,18 @@ def main():
         
         # Clear chat button
         if st.button("🗑️ Clear Chat History"):
-            st.session_state.messages = []
+            st.session_state.messages = deque(maxlen=MAX_CHAT_MESSAGES)
             st.rerun()
     
     # Main content routing
     if st.session_state.get('show_remediation', False):
-        show_remediation_dashboard(st.session_state.chatbot)
+        show_remediation_dashboard(chatbot)
     
     elif st.session_state.get('quick_action'):
-        handle_quick_action(st.session_state.quick_action, st.session_state.chatbot)
+        handle_quick_action(st.session_state.quick_action, chatbot)
     
     else:
-        show_chat_interface(st.session_state.chatbot)
+        show_chat_interface(chatbot)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
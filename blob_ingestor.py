@@ -0,0 +1,266 @@
+# blob_ingestor.py
+import json
+import sys
+import uuid
+from typing import Callable, List, Dict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from azure.storage.blob import ContainerClient
+from openai import RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from langchain_openai import AzureOpenAIEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain.docstore.document import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from tqdm import tqdm
+import numpy as np
+import tiktoken
+import logging
+
+try:
+    # orjson parses bytes directly and is several times faster than the stdlib on NDJSON;
+    # its JSONDecodeError subclasses json.JSONDecodeError
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+from config import *
+from faiss_index import build_index
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def intern_strings(values) -> List:
+    """Intern the strings in a metadata column so equal values share one object across documents."""
+    return [sys.intern(v) if isinstance(v, str) else v for v in values]
+
+class BlobIngestor:
+    """Blob storage → FAISS pipeline shared by the Windchill and HTTP log ingestors."""
+   
+    def __init__(
+        self,
+        account_name: str,
+        account_key: str,
+        container: str,
+        parse_fn: Callable[[Dict], Dict],
+        doc_fn: Callable[[List[Dict]], List[Document]],
+        index_path: str,
+        label: str = "logs",
+    ):
+        self.account_name = account_name
+        self.account_key = account_key
+        self.container = container
+        self.parse_fn = parse_fn
+        self.doc_fn = doc_fn
+        self.index_path = index_path
+        self.label = label
+       
+        self.embeddings = AzureOpenAIEmbeddings(
+            azure_deployment=EMBEDDING_DEPLOYMENT,
+            openai_api_version="2023-05-15",
+            azure_endpoint=AZURE_OPENAI_ENDPOINT,
+            api_key=AZURE_OPENAI_KEY,
+            chunk_size=EMBEDDING_CHUNK_SIZE,
+            max_retries=3,
+            timeout=30
+        )
+       
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=100,
+            length_function=len
+        )
+       
+        self.container_client = self._setup_blob_client()
+   
+    def _setup_blob_client(self):
+        """Setup Azure Blob Storage client"""
+        if not self.account_key:
+            raise ValueError(f"Blob storage account key for {self.label} not found in configuration. Please check your .env file.")
+       
+        blob_conn_str = (
+            f"DefaultEndpointsProtocol=https;"
+            f"AccountName={self.account_name};"
+            f"AccountKey={self.account_key};"
+            f"EndpointSuffix=core.windows.net"
+        )
+       
+        logger.info(f"Connecting to Azure Blob Storage: {self.account_name}/{self.container}")
+        return ContainerClient.from_connection_string(
+            conn_str=blob_conn_str,
+            container_name=self.container
+        )
+   
+    def _iter_blob_lines(self, blob_name: str):
+        """Yield the raw lines of a blob as its chunks arrive, without buffering the whole blob."""
+        downloader = self.container_client.download_blob(blob_name, max_concurrency=BLOB_MAX_CONCURRENCY)
+        buffer = b""
+        for chunk in downloader.chunks():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            yield from lines
+        if buffer:
+            yield buffer
+   
+    def _load_blob(self, blob_name: str) -> List[Dict]:
+        """Download a blob and parse its lines while it streams in."""
+        logs = []
+        for line in self._iter_blob_lines(blob_name):
+            try:
+                entry = json_loads(line)
+                logs.append(self.parse_fn(entry))
+            except json.JSONDecodeError as e:
+                logger.debug(f"JSON decode error in {blob_name}: {e}")
+                continue
+            except Exception as e:
+                logger.warning(f"Error parsing line in {blob_name}: {e}")
+                continue
+        return logs
+   
+    def fetch_logs_from_blob(self) -> List[Dict]:
+        """Download all JSON logs from blob storage and parse them."""
+        logs = []
+        try:
+            # Downloads are network-bound, so fetch blobs concurrently; each worker parses while streaming.
+            # Blobs are submitted as listing pages arrive, so downloads start before the listing finishes.
+            with ThreadPoolExecutor(max_workers=BLOB_DOWNLOAD_WORKERS) as executor:
+                futures = {}
+                blob_count = 0
+                for blob in self.container_client.list_blobs():
+                    blob_count += 1
+                    if not blob.name.endswith(".json"):
+                        logger.debug(f"Skipping non-JSON blob: {blob.name}")
+                        continue
+                    logger.info(f"📥 Downloading {blob.name}")
+                    futures[executor.submit(self._load_blob, blob.name)] = blob.name
+                logger.info(f"Found {blob_count} blobs in container")
+               
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Downloading blobs"):
+                    blob_name = futures[future]
+                    try:
+                        blob_logs = future.result()
+                        logs.extend(blob_logs)
+                        logger.info(f"✅ Processed {len(blob_logs)} lines from {blob_name}")
+                   
+                    except Exception as e:
+                        logger.error(f"❌ Error processing blob {blob_name}: {e}")
+                        continue
+           
+            logger.info(f"✅ Total {self.label} loaded from blob storage: {len(logs)}")
+       
+        except Exception as e:
+            logger.error(f"❌ Error fetching {self.label} from blob: {e}")
+            raise
+       
+        return logs
+   
+    @retry(
+        retry=retry_if_exception_type(RateLimitError),
+        wait=wait_exponential(multiplier=1, max=60),
+        stop=stop_after_attempt(6),
+        reraise=True,
+    )
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts, backing off exponentially when Azure OpenAI rate-limits us."""
+        return self.embeddings.embed_documents(texts)
+   
+    def create_faiss_index(self, documents: List[Document], index_path: str) -> int:
+        """Create FAISS index with batch processing."""
+        if not documents:
+            logger.error(f"No {self.label} documents to index")
+            return 0
+       
+        # Split documents first; anything within CHUNK_SIZE would come back from the splitter unchanged
+        short_docs = [d for d in documents if len(d.page_content) <= CHUNK_SIZE]
+        long_docs = [d for d in documents if len(d.page_content) > CHUNK_SIZE]
+        split_docs = short_docs + self.text_splitter.split_documents(long_docs)
+        logger.info(f"📊 Split {len(documents)} {self.label} documents into {len(split_docs)} chunks")
+       
+        # Embed in batches; each batch is one embed_documents call, sent as EMBEDDING_CHUNK_SIZE-input requests
+        batch_size = 500
+        embedded_docs = []
+       
+        # Tokenizer of the GPT-4 / GPT-3.5 chat models the RAG prompts are sent to. The first load downloads
+        # its BPE file, so do it here rather than at import; without it the RAG falls back to estimating tokens
+        try:
+            token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning(f"⚠️ Could not load tiktoken encoding, {self.label} chunks will have no token counts: {e}")
+            token_encoding = None
+       
+        vectors = []
+        try:
+            for i in tqdm(range(0, len(split_docs), batch_size), desc=f"Embedding {self.label} batches"):
+                batch = split_docs[i:i + batch_size]
+                texts = [d.page_content for d in batch]
+                try:
+                    batch_vectors = self._embed_batch(texts)
+                except Exception as e:
+                    logger.error(f"❌ Error embedding {self.label} batch {i//batch_size + 1}: {e}")
+                    continue
+               
+                # Store each chunk's token count so the RAG can pack prompts to a budget without tokenizing per query
+                # Log text is untrusted: count "<|endoftext|>" and the like as plain text instead of raising
+                if token_encoding is not None:
+                    for doc, tokens in zip(batch, token_encoding.encode_batch(texts, disallowed_special=())):
+                        doc.metadata["tok"] = len(tokens)
+                embedded_docs.extend(batch)
+                # Python float lists cost ~8x the memory of float32, so convert each batch as it arrives
+                vectors.append(np.asarray(batch_vectors, dtype="float32"))
+                logger.info(f"✅ Embedded {self.label} batch {i//batch_size + 1}")
+           
+            if not embedded_docs:
+                logger.error(f"❌ No {self.label} batches were embedded")
+                return 0
+           
+            # Build the HNSW / IVF-PQ index natively in one add, then wrap it for LangChain
+            logger.info(f"🔨 Creating {self.label} index with {len(embedded_docs)} documents...")
+            index = build_index(np.vstack(vectors))
+            ids = [str(uuid.uuid4()) for _ in embedded_docs]
+            vector_store = FAISS(
+                embedding_function=self.embeddings,
+                index=index,
+                docstore=InMemoryDocstore(dict(zip(ids, embedded_docs))),
+                index_to_docstore_id=dict(enumerate(ids)),
+            )
+            logger.info(f"🕸️ Built {type(index).__name__} {self.label} index over {index.ntotal} vectors")
+           
+            # Save index
+            vector_store.save_local(index_path)
+            logger.info(f"💾 {self.label.capitalize()} index saved to {index_path}")
+           
+            return len(embedded_docs)
+       
+        except Exception as e:
+            logger.error(f"❌ Error creating {self.label} FAISS index: {e}")
+            raise
+   
+    def ingest(self, index_path: str = None) -> int:
+        """Main ingestion pipeline: blob storage → documents → FAISS index."""
+        index_path = index_path or self.index_path
+        logger.info(f"🚀 Starting {self.label} ingestion...")
+        logger.info(f"Azure OpenAI Endpoint: {AZURE_OPENAI_ENDPOINT}")
+        logger.info(f"Blob Storage: {self.account_name}/{self.container}")
+       
+        # Fetch logs from blob storage
+        logs = self.fetch_logs_from_blob()
+       
+        if not logs:
+            logger.error(f"❌ No {self.label} found in blob storage!")
+            return 0
+       
+        # Convert to documents
+        documents = self.doc_fn(logs)
+        logger.info(f"📄 Created {len(documents)} {self.label} documents")
+       
+        if not documents:
+            logger.error(f"❌ No documents created from {self.label}!")
+            return 0
+       
+        # Create FAISS index
+        count = self.create_faiss_index(documents, index_path)
+       
+        logger.info(f"🎯 {self.label.capitalize()} ingestion complete! Processed {count} document chunks.")
+        return count
@@ -18,6 +18,9 @@ BLOB_CONTAINER = os.getenv("BLOB_CONTAINER", "insights-logs-apptraces")
 # Processing Config
 BATCH_SIZE = int(os.getenv("BATCH_SIZE", "5"))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
+BLOB_DOWNLOAD_WORKERS = int(os.getenv("BLOB_DOWNLOAD_WORKERS", "16"))  # blobs downloaded in parallel
+BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "4"))  # ranged GETs per blob
+EMBEDDING_CHUNK_SIZE = int(os.getenv("EMBEDDING_CHUNK_SIZE", "256"))  # inputs per embeddings request
 FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "faiss_blob_logs")
 
 # HTTP Logs Configuration
@@ -26,6 +29,19 @@ HTTP_ACCOUNT_KEY = os.getenv("HTTP_BLOB_ACCOUNT_KEY")
 HTTP_BLOB_CONTAINER = os.getenv("HTTP_BLOB_CONTAINER", "insights-logs-apptraces")
 FAISS_HTTP_INDEX_PATH = os.getenv("FAISS_HTTP_INDEX_PATH", "faiss_http_index")
 
+# FAISS Index Configuration
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "hnsw").lower()  # "hnsw", "hnsw_sq8" or "ivfpq"
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))  # graph neighbours per node
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))  # query-time search depth
+FAISS_INDEX_FACTORY = os.getenv("FAISS_INDEX_FACTORY", "")  # optional spec for "ivfpq", e.g. "IVF{nlist},PQ32"
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "32"))  # PQ sub-quantizers (bytes per vector at 8 bits)
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+FAISS_PQ_TRAIN_SIZE = int(os.getenv("FAISS_PQ_TRAIN_SIZE", "100000"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))  # IVF cells visited per query
+FAISS_MMAP = os.getenv("FAISS_MMAP", "true").lower() == "true"  # map index files instead of reading them into RAM
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "256"))  # cached (index, question) searches
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))  # max log tokens packed into one prompt
+
 
 
 ####################################################
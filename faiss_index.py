@@ -0,0 +1,105 @@
+# faiss_index.py
+import os
+import math
+import pickle
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from config import *
+
+# Product quantization needs a reasonable number of training points per centroid
+PQ_MIN_TRAIN_POINTS = 39 * 256
+
+
+def build_hnsw_index(vectors) -> faiss.Index:
+    """Build an HNSW graph index over an (N, d) embedding matrix. No training step is needed."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = faiss.IndexHNSWFlat(vectors.shape[1], FAISS_HNSW_M)
+    index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    index.add(vectors)
+    return index
+
+
+def build_hnsw_sq8_index(vectors) -> faiss.Index:
+    """Build an HNSW graph over 8-bit scalar-quantized vectors: a quarter of the bytes of float32 per vector."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, d = vectors.shape
+    index = faiss.IndexHNSWSQ(d, faiss.ScalarQuantizer.QT_8bit, FAISS_HNSW_M)
+    index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    
+    # SQ training only learns per-dimension ranges, so a sample of any size works
+    sample_size = min(n, FAISS_PQ_TRAIN_SIZE)
+    index.train(vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)])
+    index.add(vectors)
+    return index
+
+
+def ivfpq_factory_string(n: int) -> str:
+    """Index-factory spec for an n-vector IVF-PQ index, with nlist ≈ √n."""
+    nlist = max(1, min(int(math.sqrt(n)), n // 39))
+    spec = FAISS_INDEX_FACTORY or "IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    return spec.format(nlist=nlist, pq_m=FAISS_PQ_M, pq_nbits=FAISS_PQ_NBITS)
+
+
+def build_ivfpq_index(vectors) -> faiss.Index:
+    """Build an IVF index with product-quantized codes (FAISS_PQ_M bytes per vector at 8 bits)."""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    n, d = vectors.shape
+    spec = ivfpq_factory_string(n)
+    index = faiss.index_factory(d, spec, faiss.METRIC_L2)
+    print(f"🧩 Building {spec} index over {n} vectors")
+   
+    # Train on a random sample rather than the full corpus
+    sample_size = min(n, FAISS_PQ_TRAIN_SIZE)
+    sample = vectors[np.random.default_rng(0).choice(n, sample_size, replace=False)]
+    index.train(sample)
+    index.add(vectors)
+    return tune_index(index)
+
+
+def build_index(vectors) -> faiss.Index:
+    """Build a FAISS_INDEX_TYPE index over an (N, d) embedding matrix in a single native add."""
+    n = len(vectors)
+    if FAISS_INDEX_TYPE == "hnsw_sq8":
+        return build_hnsw_sq8_index(vectors)
+    if FAISS_INDEX_TYPE == "ivfpq":
+        if n >= PQ_MIN_TRAIN_POINTS:
+            return build_ivfpq_index(vectors)
+        print(f"⚠️ Only {n} vectors, too few to train PQ; building HNSW instead")
+    return build_hnsw_index(vectors)
+
+
+def convert_index(index: faiss.Index) -> faiss.Index:
+    """Rebuild a flat index (LangChain's default) as FAISS_INDEX_TYPE, keeping vector ids in the same order."""
+    if index.ntotal == 0:
+        return index
+    return build_index(index.reconstruct_n(0, index.ntotal))
+
+
+def tune_index(index: faiss.Index) -> faiss.Index:
+    """Apply query-time search parameters to a loaded index."""
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    try:
+        # Also reaches the IVF layer inside factory-built wrappers such as "OPQ32,IVF1024,PQ32"
+        faiss.extract_index_ivf(index).nprobe = FAISS_IVF_NPROBE
+    except RuntimeError:
+        pass
+    return index
+
+
+def load_vector_store(folder_path: str, embeddings) -> FAISS:
+    """Load a store saved by FAISS.save_local, memory-mapping index.faiss when FAISS_MMAP is set.
+    
+    FAISS maps the parts of the file it can (e.g. IVF inverted lists) and reads the rest, so
+    startup and RSS no longer scale with the whole index. index.pkl is trusted local data,
+    as with load_local(allow_dangerous_deserialization=True).
+    """
+    if not FAISS_MMAP:
+        return FAISS.load_local(folder_path, embeddings, allow_dangerous_deserialization=True)
+    
+    index = faiss.read_index(os.path.join(folder_path, "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    with open(os.path.join(folder_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
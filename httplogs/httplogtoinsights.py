@@ -4,6 +4,7 @@ import logging
 import socket
 import json
 import threading
+from array import array
 import numpy as np
 from datetime import datetime
 from opencensus.ext.azure.log_exporter import AzureLogHandler
@@ -12,7 +13,20 @@ from opencensus.stats import measure as measure_module
 from opencensus.stats import view as view_module
 from opencensus.stats import aggregation as aggregation_module
 from opencensus.ext.azure import metrics_exporter
-import re
+
+try:
+    # C-implemented JSON for the state file, several times faster than the stdlib
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj):
+        return json.dumps(obj).encode("utf-8")
+
+try:
+    # Streaming quantile sketch (opt-in via USE_TDIGEST): constant memory per interval, but far slower per update
+    from tdigest import TDigest
+except ImportError:
+    TDigest = None
 
 # ========================
 # CONFIGURATION
@@ -21,6 +35,8 @@ ACCESS_LOG = r"C:\ptc\Windchill_13.0\HTTPServer\logs\access.log"
 SCRIPT_LOG = "script.log"
 STATE_FILE = "log_state.json"
 POLL_INTERVAL = 60  # seconds
+# Keep exact percentiles from a 64-bit int array (no overflow on huge response times) unless an interval's response times won't fit in memory
+USE_TDIGEST = os.getenv("USE_TDIGEST", "false").lower() == "true"
 
 CONNECTION_STRING = ""
 HOSTNAME = socket.gethostname()
@@ -117,68 +133,105 @@ for v in views.values():
 
 metrics_exporter_instance = metrics_exporter.new_metrics_exporter(connection_string=CONNECTION_STRING)
 view_manager.register_exporter(metrics_exporter_instance)
-mmap = stats.stats_recorder.new_measurement_map()
 
-def record_metric(name, value):
-    if name in measures:
-        if isinstance(value,int):
-            mmap.measure_int_put(measures[name], value)
-        else:
-            mmap.measure_float_put(measures[name], value)
-        mmap.record()
+# Callers know each measure's type, so pick the typed put up front instead of checking per call.
+# A measurement map re-records every measure ever put on it, so each record uses a fresh map.
+def record_int(name, value):
+    measurement_map = stats.stats_recorder.new_measurement_map()
+    measurement_map.measure_int_put(measures[name], value)
+    measurement_map.record()
+
+def record_float(name, value):
+    measurement_map = stats.stats_recorder.new_measurement_map()
+    measurement_map.measure_float_put(measures[name], value)
+    measurement_map.record()
 
 # ========================
 # STATE MANAGEMENT
 # ========================
 last_access_pos = 0
+last_saved_pos = None
 def load_state():
-    global last_access_pos
+    global last_access_pos, last_saved_pos
     if os.path.exists(STATE_FILE):
         try:
-            with open(STATE_FILE,"r") as f:
-                state = json.load(f)
+            with open(STATE_FILE,"rb") as f:
+                state = json_loads(f.read())
                 last_access_pos = state.get("last_access_pos",0)
+                last_saved_pos = last_access_pos
                 logger.info("[state] Loaded state from file")
         except Exception as e:
             logger.error(f"[state] Failed to load state: {e}")
 
 def save_state():
+    global last_saved_pos
+    if last_access_pos == last_saved_pos:
+        return
     try:
-        with open(STATE_FILE,"w") as f:
-            json.dump({"last_access_pos": last_access_pos}, f)
-        logger.info("[state] Saved state to file")
+        # Write a temp file and rename over the old one so a kill mid-write never leaves corrupt JSON
+        tmp_file = STATE_FILE + ".tmp"
+        with open(tmp_file,"wb") as f:
+            f.write(json_dumps({"last_access_pos": last_access_pos}))
+        os.replace(tmp_file, STATE_FILE)
+        last_saved_pos = last_access_pos
+        logger.debug("[state] Saved state to file")
     except Exception as e:
         logger.error(f"[state] Failed to save state: {e}")
 
 # ========================
 # PARSE ACCESS LOG LINE
 # ========================
-log_pattern = re.compile(r'(\S+) - (\S+) \[(.*?)\] "(.*?) (.*?) (HTTP/\d\.\d)" (\d{3}) (\d+) (\d+)')
+# Access-log lines are positional: ip - user [timestamp] "method url protocol" status size time
+# Splitting on the quote and space delimiters is several times faster than the backtracking regex.
+# Characters an IPv4 or IPv6 client address can start with
+IP_FIRST_CHARS = frozenset("0123456789abcdefABCDEF:")
 
 def parse_log_line(line):
-    match = log_pattern.match(line)
-    if match:
-        client_ip = match.group(1)
-        user = match.group(2)
-        timestamp = match.group(3)
-        method = match.group(4)
-        url = match.group(5)
-        protocol = match.group(6)
-        status = int(match.group(7))
-        size = int(match.group(8))
-        response_time = int(match.group(9))
-        return {
-            "client_ip": client_ip,
-            "user": user,
-            "timestamp": timestamp,
-            "method": method,
-            "url": url,
-            "protocol": protocol,
-            "status": status,
-            "size": size,
-            "response_time": response_time
-        }
-    return None
+    # Blank, comment and other non-request lines bail out before any splitting
+    if not line or line[0] not in IP_FIRST_CHARS or '"' not in line:
+        return None
+    head, sep, rest = line.partition(' "')
+    if not sep:
+        return None
+    # The request ends at the first '" ' followed by a 3-digit status; earlier ones are escaped quotes in the URL
+    end = rest.find('" ')
+    while end != -1 and not (rest[end + 2:end + 5].isdigit() and rest[end + 5:end + 6] == " "):
+        end = rest.find('" ', end + 1)
+    if end == -1:
+        return None
+    request, tail = rest[:end], rest[end + 2:]
+
+    head_parts = head.split(" ", 3)
+    if len(head_parts) != 4 or head_parts[1] != "-":
+        return None
+    client_ip, _, user, timestamp = head_parts
+    if timestamp[:1] != "[" or timestamp[-1:] != "]":
+        return None
+
+    method, _, target = request.partition(" ")
+    url, _, protocol = target.rpartition(" ")
+    if not method or not url or not protocol.startswith("HTTP/"):
+        return None
+
+    fields = tail.split(None, 3)
+    if len(fields) < 3 or len(fields[0]) != 3:
+        return None
+    try:
+        status, size, response_time = int(fields[0]), int(fields[1]), int(fields[2])
+    except ValueError:
+        return None
+
+    return {
+        "client_ip": client_ip,
+        "user": user,
+        "timestamp": timestamp[1:-1],
+        "method": method,
+        "url": url,
+        "protocol": protocol,
+        "status": status,
+        "size": size,
+        "response_time": response_time
+    }
 
 # ========================
 # SEND ACCESS LOG METRICS & TRACES
@@ -192,25 +245,38 @@ def send_access_metrics():
 
     request_count = 0
     error_count = 0
-    response_times = []
+    response_total = 0
+    digest = TDigest() if USE_TDIGEST and TDigest else None
+    # 64-bit C ints: logged response times can exceed 2**31, and this is still a fraction of list[int]'s memory
+    response_times = array("q")
+    last_response_time = 0
+    error_measure = measures["error_http_count"]
+    new_measurement_map = stats.stats_recorder.new_measurement_map
 
-    with open(ACCESS_LOG,"r") as f:
+    # Iterate the handle rather than readlines() so a large backlog is never held in memory at once;
+    # errors="replace" keeps one bad byte from stopping the monitor
+    with open(ACCESS_LOG,"r",buffering=1<<20,encoding="utf-8",errors="replace") as f:
         f.seek(last_access_pos)
-        lines = f.readlines()
-        last_access_pos = f.tell()
 
-        for line in lines:
+        for line in f:
             line = line.strip()
             if not line: continue
             log_data = parse_log_line(line)
             if not log_data: continue
 
             request_count += 1
-            response_times.append(log_data["response_time"])
-            record_metric("response_time", log_data["response_time"])
+            response_total += log_data["response_time"]
+            if digest is not None:
+                digest.update(log_data["response_time"])
+            else:
+                response_times.append(log_data["response_time"])
+            last_response_time = log_data["response_time"]
             if log_data["status"] >= 400:
                 error_count += 1
-                record_metric("error_http_count",1)
+                # Count aggregation: one record per error, on a fresh map since record() re-records every put
+                error_map = new_measurement_map()
+                error_map.measure_int_put(error_measure, 1)
+                error_map.record()
 
             # Send structured log to App Insights
             logger.info(
@@ -218,19 +284,28 @@ def send_access_metrics():
                 extra={"custom_dimensions": {**log_data, "hostname": HOSTNAME, "source":"AccessLog"}}
             )
 
+        last_access_pos = f.tell()
+
     if request_count > 0:
-        record_metric("request_count", request_count)
+        # response_time_view keeps only the last value, so one record per interval exports the same metric
+        record_int("response_time", last_response_time)
+        record_int("request_count", request_count)
         error_rate = (error_count/request_count)*100
-        record_metric("error_rate", error_rate)
-        avg_response = int(np.mean(response_times))
-        record_metric("avg_response_time", avg_response)
+        record_float("error_rate", error_rate)
+        avg_response = int(response_total/request_count)
+        record_int("avg_response_time", avg_response)
+        if digest is not None:
+            p50, p90, p99 = (digest.percentile(q) for q in (50, 90, 99))
+        else:
+            # Zero-copy view of the array, and one sort for all three quantiles
+            p50, p90, p99 = np.percentile(np.frombuffer(response_times, dtype=np.int64), (50, 90, 99))
 
         logger.info(
             f"[Metrics] Requests:{request_count}, Errors:{error_count}, ErrorRate:{error_rate:.2f}%, "
             f"Avg:{avg_response}ms, "
-            f"p50:{int(np.percentile(response_times,50))}ms, "
-            f"p90:{int(np.percentile(response_times,90))}ms, "
-            f"p99:{int(np.percentile(response_times,99))}ms"
+            f"p50:{int(p50)}ms, "
+            f"p90:{int(p90)}ms, "
+            f"p99:{int(p99)}ms"
         )
 
 # ========================
@@ -242,7 +317,7 @@ if __name__=="__main__":
     try:
         while True:
             send_access_metrics()
-            record_metric("heartbeat",1)
+            record_int("heartbeat",1)
             save_state()
             time.sleep(POLL_INTERVAL)
     except KeyboardInterrupt:
@@ -1,10 +1,18 @@
 import os
 import time
 import glob
+import fnmatch
 import logging
+import logging.handlers
+import queue
 import threading
 import json
+import re
 import socket
+import struct
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from mmap import mmap as MemoryMap, ACCESS_READ, ACCESS_WRITE, ALLOCATIONGRANULARITY
  
 from opencensus.ext.azure.log_exporter import AzureLogHandler
 from opencensus.stats import stats as stats_module
@@ -13,6 +21,13 @@ from opencensus.stats import view as view_module
 from opencensus.stats import aggregation as aggregation_module
 from opencensus.ext.azure import metrics_exporter
  
+try:
+    # Kernel change notifications (ReadDirectoryChangesW / inotify) instead of rescanning every poll
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+ 
 # ========================
 # CONFIGURATION
 # ========================
@@ -24,13 +39,22 @@ LOG_PATTERNS = {
     "UpgradeManager": "UpgradeManager-*-log4j.log",
 }
 POLL_INTERVAL = 60  # seconds
-STATE_FILE = "log_state.json"
+EVENT_DEBOUNCE = 1  # seconds to let a burst of writes settle before reading
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"  # echo every shipped line to stdout
+ 
+# One C-level scan per line finds the level keyword ("WARN" also covers "WARNING")
+LEVEL_RE = re.compile(rb"ERROR|WARN")
+STATE_FILE = "log_state.bin"
+LEGACY_STATE_FILE = "log_state.json"
  
 CONNECTION_STRING = (""
 )
  
 HOSTNAME = socket.gethostname()
  
+# Trace `extra` per source, built once; AzureLogHandler copies custom_dimensions rather than mutating them
+TRACE_EXTRAS = {source: {"custom_dimensions": {"hostname": HOSTNAME, "source": source}} for source in LOG_PATTERNS}
+ 
 # ========================
 # SETUP LOGGER (Traces)
 # ========================
@@ -41,7 +65,11 @@ trace_handler = AzureLogHandler(connection_string=CONNECTION_STRING)
 if not hasattr(trace_handler, "lock") or trace_handler.lock is None:
     trace_handler.lock = threading.RLock()
  
-logger.addHandler(trace_handler)
+# The parser thread only enqueues records; a listener thread feeds them to AzureLogHandler,
+# so send_new_logs never waits on the handler lock
+trace_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(trace_queue))
+trace_listener = logging.handlers.QueueListener(trace_queue, trace_handler)
  
 # ========================
 # SETUP METRICS (Custom Metrics)
@@ -55,7 +83,8 @@ measures = {
  
 views = {}
 for name, measure in measures.items():
-    agg = aggregation_module.CountAggregation() if "count" in name else aggregation_module.LastValueAggregation()
+    # Counts are recorded as per-poll totals, so sum the recorded values rather than counting records
+    agg = aggregation_module.SumAggregation() if "count" in name else aggregation_module.LastValueAggregation()
     views[name] = view_module.View(f"{name}_view", f"{name.replace('_', ' ').title()}", [], measure, agg)
  
 stats = stats_module.stats
@@ -66,37 +95,109 @@ for v in views.values():
 metrics_exporter_instance = metrics_exporter.new_metrics_exporter(connection_string=CONNECTION_STRING)
 view_manager.register_exporter(metrics_exporter_instance)
  
-mmap = stats.stats_recorder.new_measurement_map()
+# A measurement map re-records every measure ever put on it, so each record uses a fresh map
+# Sources are processed on parallel threads, and the shared view data's sum update isn't atomic
+metrics_lock = threading.Lock()
  
  
 def record_metric(name: str, value: int = 1):
     if name in measures:
-        mmap.measure_int_put(measures[name], value)
-        mmap.record()
+        measurement_map = stats.stats_recorder.new_measurement_map()
+        measurement_map.measure_int_put(measures[name], value)
+        with metrics_lock:
+            measurement_map.record()
+ 
+ 
+def flush_counts(counts: dict):
+    """Record a poll's per-level line counts with one put per measure and a single record()."""
+    if not any(counts.values()):
+        return
+    measurement_map = stats.stats_recorder.new_measurement_map()
+    for name, value in counts.items():
+        if value:
+            measurement_map.measure_int_put(measures[name], value)
+    with metrics_lock:
+        measurement_map.record()
  
  
 # ========================
 # STATE MANAGEMENT
 # ========================
+# The state file is a table of fixed 16-byte records [u64 path hash | u64 byte offset], memory-mapped
+# so a save just packs the changed integers in place; a zero hash marks an unused slot
+STATE_RECORD = struct.Struct("<QQ")
+ 
 last_positions = {}
+saved_offsets = {}  # path hash -> offset read from the state file
+state_slots = {}  # path hash -> record index in the state file
+path_keys = {}
+next_slot = 0
+state_fd = None
+state_map = None
+ 
+ 
+def state_key(path: str) -> int:
+    key = path_keys.get(path)
+    if key is None:
+        digest = hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest()
+        key = path_keys[path] = int.from_bytes(digest, "little") or 1
+    return key
+ 
+ 
+def open_state_map(slots: int):
+    """(Re)map the state file with room for at least `slots` records."""
+    global state_fd, state_map
+    if state_map is not None:
+        state_map.close()
+    if state_fd is None:
+        state_fd = os.open(STATE_FILE, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+    size = max(16, 1 << (slots - 1).bit_length()) * STATE_RECORD.size
+    current_size = os.fstat(state_fd).st_size
+    if current_size < size:
+        os.ftruncate(state_fd, size)
+    state_map = MemoryMap(state_fd, max(size, current_size - current_size % STATE_RECORD.size), access=ACCESS_WRITE)
  
  
 def load_state():
-    global last_positions
+    global last_positions, next_slot
     if os.path.exists(STATE_FILE):
         try:
-            with open(STATE_FILE, "r") as f:
+            with open(STATE_FILE, "rb") as f:
+                data = f.read()
+            data = data[:len(data) - len(data) % STATE_RECORD.size]
+            for slot, (key, offset) in enumerate(STATE_RECORD.iter_unpack(data)):
+                if key:
+                    saved_offsets[key] = offset
+                    state_slots[key] = slot
+                    next_slot = slot + 1
+            print("[state] Loaded state from file")
+        except Exception as e:
+            print(f"[state] Failed to load state: {e}")
+    elif os.path.exists(LEGACY_STATE_FILE):
+        # One-time migration from the old JSON state; the next save writes the binary table
+        try:
+            with open(LEGACY_STATE_FILE, "r") as f:
                 state = json.load(f)
                 last_positions = state.get("last_positions", {})
-                print("[state] Loaded state from file")
+                print("[state] Loaded legacy JSON state")
         except Exception as e:
             print(f"[state] Failed to load state: {e}")
  
  
 def save_state():
+    global next_slot
     try:
-        with open(STATE_FILE, "w") as f:
-            json.dump({"last_positions": last_positions}, f)
+        for path, offset in last_positions.items():
+            key = state_key(path)
+            slot = state_slots.get(key)
+            if slot is None:
+                slot = state_slots[key] = next_slot
+                next_slot += 1
+            if state_map is None or (slot + 1) * STATE_RECORD.size > len(state_map):
+                open_state_map(slot + 1)
+            STATE_RECORD.pack_into(state_map, slot * STATE_RECORD.size, key, offset)
+        if state_map is not None:
+            state_map.flush()
         print("[state] Saved state to file")
     except Exception as e:
         print(f"[state] Failed to save state: {e}")
@@ -105,40 +206,135 @@ def save_state():
 # ========================
 # LOG PROCESSING
 # ========================
+# Glob results per pattern, reused until LOG_FOLDER's mtime changes (a log was added, removed or renamed)
+glob_cache = {}
+glob_cache_mtime = None
+ 
+ 
+def find_log_files(pattern: str):
+    global glob_cache_mtime
+    try:
+        folder_mtime = os.stat(LOG_FOLDER).st_mtime_ns
+    except OSError:
+        return []
+    if folder_mtime != glob_cache_mtime:
+        glob_cache.clear()
+        glob_cache_mtime = folder_mtime
+    log_files = glob_cache.get(pattern)
+    if log_files is None:
+        log_files = glob_cache[pattern] = glob.glob(os.path.join(LOG_FOLDER, pattern))
+    return log_files
+ 
+ 
 def send_new_logs(source: str, pattern: str):
     global last_positions
  
-    log_files = glob.glob(os.path.join(LOG_FOLDER, pattern))
+    counts = {"error_count": 0, "warn_count": 0, "info_count": 0}
+    level_dispatch = {
+        b"ERROR": (logger.error, "error_count"),
+        b"WARN": (logger.warning, "warn_count"),
+        None: (logger.info, "info_count"),
+    }
+    extra = TRACE_EXTRAS[source]
+    log_files = find_log_files(pattern)
     for log_file in log_files:
         if log_file not in last_positions:
-            last_positions[log_file] = 0
+            last_positions[log_file] = saved_offsets.get(state_key(log_file), 0)
  
         try:
-            with open(log_file, "r") as f:
-                f.seek(last_positions[log_file])
-                new_lines = f.readlines()
-                last_positions[log_file] = f.tell()
- 
-                for line in new_lines:
-                    line = line.strip()
-                    if not line:
-                        continue
- 
-                    if "ERROR" in line:
-                        logger.error(line, extra={"custom_dimensions": {"hostname": HOSTNAME, "source": source}})
-                        record_metric("error_count")
-                    elif "WARN" in line or "WARNING" in line:
-                        logger.warning(line, extra={"custom_dimensions": {"hostname": HOSTNAME, "source": source}})
-                        record_metric("warn_count")
-                    else:
-                        logger.info(line, extra={"custom_dimensions": {"hostname": HOSTNAME, "source": source}})
-                        record_metric("info_count")
- 
-                    print(f"[{source}] {os.path.basename(log_file)}: {line}")
+            # Idle files (often ServerManager / UpgradeManager) cost one stat instead of open+fstat+close
+            if os.stat(log_file).st_size == last_positions[log_file]:
+                continue
+ 
+            fd = os.open(log_file, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+            try:
+                size = os.fstat(fd).st_size
+                start = last_positions[log_file]
+                if size < start:
+                    # File was truncated or rotated in place; read it again from the top
+                    start = 0
+ 
+                if size > start:
+                    # Map only the new tail (the offset must sit on an allocation boundary) and scan it in place
+                    offset = start - start % ALLOCATIONGRANULARITY
+                    with MemoryMap(fd, size - offset, access=ACCESS_READ, offset=offset) as tail:
+                        tail.seek(start - offset)
+                        echo_prefix = f"[{source}] {os.path.basename(log_file)}: "
+                        for raw_line in iter(tail.readline, b""):
+                            raw_line = raw_line.strip()
+                            if not raw_line:
+                                continue
+                            line = raw_line.decode("utf-8", errors="replace")
+ 
+                            match = LEVEL_RE.search(raw_line)
+                            log_fn, count_name = level_dispatch[match.group() if match else None]
+                            log_fn(line, extra=extra)
+                            counts[count_name] += 1
+ 
+                            if DEBUG:
+                                print(echo_prefix + line)
+ 
+                last_positions[log_file] = size
+            finally:
+                os.close(fd)
  
         except Exception as e:
             logger.error(f"Failed to read {log_file}: {e}")
  
+    flush_counts(counts)
+ 
+ 
+# ========================
+# CHANGE WATCHING
+# ========================
+# Sources with unread lines; every source starts pending so the first pass catches up
+pending_sources = set(LOG_PATTERNS)
+pending_lock = threading.Lock()
+logs_changed = threading.Event()
+ 
+ 
+def on_log_event(event):
+    """watchdog callback: mark the source whose log file was created or modified."""
+    if event.is_directory:
+        return
+    name = os.path.basename(event.src_path)
+    for source, pattern in LOG_PATTERNS.items():
+        if fnmatch.fnmatch(name, pattern):
+            with pending_lock:
+                pending_sources.add(source)
+            logs_changed.set()
+            return
+ 
+ 
+def start_watcher():
+    """Watch LOG_FOLDER for log writes; returns None (polling) when watchdog isn't installed or can't watch."""
+    if Observer is None:
+        print(f"watchdog not installed; polling every {POLL_INTERVAL} seconds")
+        return None
+    handler = FileSystemEventHandler()
+    handler.on_created = on_log_event
+    handler.on_modified = on_log_event
+    observer = Observer()
+    try:
+        observer.schedule(handler, LOG_FOLDER, recursive=False)
+        observer.start()
+    except Exception as e:
+        print(f"⚠️ Cannot watch {LOG_FOLDER} ({e}); polling every {POLL_INTERVAL} seconds")
+        return None
+    print("Watching for log changes")
+    return observer
+ 
+ 
+# The sources are independent files, so their reads and trace hand-offs overlap on one thread each
+source_pool = ThreadPoolExecutor(max_workers=len(LOG_PATTERNS), thread_name_prefix="log-source")
+ 
+ 
+def take_pending_sources():
+    with pending_lock:
+        sources = list(pending_sources)
+        pending_sources.clear()
+    return sources
+ 
  
 # ========================
 # MAIN LOOP
@@ -146,17 +342,36 @@ def send_new_logs(source: str, pattern: str):
 if __name__ == "__main__":
     print("Monitoring MethodServer, BackgroundMethodServer, ServerManager, UpgradeManager logs for metrics...")
     load_state()
+    trace_listener.start()
+    observer = start_watcher()
+    next_heartbeat = time.monotonic()
     try:
         while True:
-            # Process all defined log sources
-            for source, pattern in LOG_PATTERNS.items():
-                send_new_logs(source, pattern)
- 
-            # Heartbeat
-            record_metric("heartbeat", 1)
- 
-            save_state()
-            time.sleep(POLL_INTERVAL)
+            # Process the log sources that changed since the last pass, in parallel
+            list(source_pool.map(lambda source: send_new_logs(source, LOG_PATTERNS[source]), take_pending_sources()))
+ 
+            if time.monotonic() >= next_heartbeat:
+                # Heartbeat
+                record_metric("heartbeat", 1)
+ 
+                save_state()
+                next_heartbeat = time.monotonic() + POLL_INTERVAL
+ 
+                # Full rescan on every tick: the polling path, and a safety net for missed events
+                with pending_lock:
+                    pending_sources.update(LOG_PATTERNS)
+ 
+            # Sleep until a log changes (or, without watchdog, until the next tick)
+            if observer:
+                if logs_changed.wait(max(0, next_heartbeat - time.monotonic())):
+                    # Debounce: a busy log fires many events, so let them settle and read once
+                    time.sleep(min(EVENT_DEBOUNCE, max(0, next_heartbeat - time.monotonic())))
+                logs_changed.clear()
+            else:
+                time.sleep(max(0, next_heartbeat - time.monotonic()))
     except KeyboardInterrupt:
         print("Stopping script...")
-        save_state()
\ No newline at end of file
+        if observer:
+            observer.stop()
+        save_state()
+        trace_listener.stop()  # drains queued traces into AzureLogHandler
\ No newline at end of file
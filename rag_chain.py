@@ -1,10 +1,14 @@
 # rag_chain.py
 import os
-from langchain_community.vectorstores import FAISS
+import functools
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from langchain_openai import AzureOpenAIEmbeddings, AzureChatOpenAI
-from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from config import *
+from faiss_index import load_vector_store, tune_index
 
 class WindchillRAG:
     def __init__(self, windchill_index_path: str = FAISS_INDEX_PATH, 
@@ -20,26 +24,22 @@ class WindchillRAG:
        
         # Load both vector stores
         try:
-            self.windchill_vector_store = FAISS.load_local(
-                windchill_index_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+            self.windchill_vector_store = load_vector_store(windchill_index_path, self.embeddings)
             print(f"✅ Loaded Windchill FAISS index from {windchill_index_path}")
         except Exception as e:
             print(f"❌ Error loading Windchill FAISS index: {e}")
             raise
         
         try:
-            self.http_vector_store = FAISS.load_local(
-                http_index_path,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+            self.http_vector_store = load_vector_store(http_index_path, self.embeddings)
             print(f"✅ Loaded HTTP FAISS index from {http_index_path}")
         except Exception as e:
             print(f"❌ Error loading HTTP FAISS index: {e}")
             raise
+        
+        # Apply query-time search parameters (e.g. HNSW efSearch)
+        tune_index(self.windchill_vector_store.index)
+        tune_index(self.http_vector_store.index)
        
         # Initialize LLM
         self.llm = AzureChatOpenAI(
@@ -59,6 +59,15 @@ class WindchillRAG:
         self.http_retriever = self.http_vector_store.as_retriever(
             search_type="similarity", search_kwargs={"k": 5}
         )
+        
+        # Held for the life of the RAG so combined queries don't pay for a new pool (or event loop) each time
+        self.retrieval_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="retrieval")
+        
+        # Repeat questions skip the embedding RPC and the FAISS search; keyed on (index name, question)
+        self._cached_text_search = functools.lru_cache(maxsize=RETRIEVAL_CACHE_SIZE)(self._text_search)
+        # The RAG is shared across Streamlit sessions, so the context cache is guarded by a lock
+        self._context_cache = OrderedDict()
+        self._context_lock = threading.Lock()
        
         # Create custom prompts for different log types
         self.combined_prompt_template = PromptTemplate(
@@ -165,55 +174,26 @@ Prefer specific, actionable recommendations over general advice.
 REMEDIATION REPORT:""",
             input_variables=["context", "question"]
         )
+        
+        # The templates are static f-string templates, so fill them with their bound str.format
+        # directly rather than through PromptTemplate.format's per-call validation
+        self.combined_prompt_format = self.combined_prompt_template.template.format
+        self.windchill_prompt_format = self.windchill_prompt_template.template.format
+        self.http_prompt_format = self.http_prompt_template.template.format
+        self.remediation_prompt_format = self.remediation_prompt_template.template.format
    
-    def query(self, question: str, log_type: str = "combined"):
-        """Query the RAG system with a question"""
+    def query(self, question: str, log_type: str = "combined", vector=None):
+        """Query the RAG system with a question, by text or by pre-computed embedding.
+        
+        Every log type goes through the cached retrieval and the token-budgeted prompt.
+        """
         try:
-            if log_type == "combined":
-                # Get documents from both sources
-                windchill_docs = self.windchill_retriever.get_relevant_documents(question)
-                http_docs = self.http_retriever.get_relevant_documents(question)
-                
-                windchill_context = "\n\n".join([doc.page_content for doc in windchill_docs])
-                http_context = "\n\n".join([doc.page_content for doc in http_docs])
-                
-                # Use combined prompt
-                prompt = self.combined_prompt_template.format(
-                    windchill_context=windchill_context,
-                    http_context=http_context,
-                    question=question
-                )
-                
-                result = self.llm.invoke(prompt)
-                source_docs = windchill_docs + http_docs
-                
-            elif log_type == "windchill":
-                # Use only windchill logs
-                qa_chain = RetrievalQA.from_chain_type(
-                    llm=self.llm,
-                    chain_type="stuff",
-                    retriever=self.windchill_retriever,
-                    chain_type_kwargs={"prompt": self.windchill_prompt_template},
-                    return_source_documents=True
-                )
-                result = qa_chain.invoke({"query": question})
-                source_docs = result.get("source_documents", [])
-                
-            else:  # http logs
-                # Use only http logs
-                qa_chain = RetrievalQA.from_chain_type(
-                    llm=self.llm,
-                    chain_type="stuff",
-                    retriever=self.http_retriever,
-                    chain_type_kwargs={"prompt": self.http_prompt_template},
-                    return_source_documents=True
-                )
-                result = qa_chain.invoke({"query": question})
-                source_docs = result.get("source_documents", [])
+            windchill_docs, http_docs = self._retrieve(question, log_type, vector)
+            result = self.llm.invoke(self._build_prompt(question, log_type, windchill_docs, http_docs))
             
             return {
-                "result": result["result"] if isinstance(result, dict) else result.content,
-                "source_documents": source_docs,
+                "result": result.content,
+                "source_documents": windchill_docs + http_docs,
                 "log_type": log_type
             }
         except Exception as e:
@@ -223,18 +203,164 @@ REMEDIATION REPORT:""",
                 "log_type": log_type
             }
     
+    def query_with_vector(self, question: str, vector, log_type: str = "combined"):
+        """Query the RAG system with a pre-computed question embedding (skips the embedding call)"""
+        return self.query(question, log_type, vector)
+    
+    def stream(self, question: str, log_type: str = "combined", vector=None):
+        """Retrieve context and stream the LLM answer token by token.
+        
+        Returns (source_documents, token_iterator). Retrieval runs before this returns,
+        so the sources are available while the answer is still streaming.
+        """
+        windchill_docs, http_docs = self._retrieve(question, log_type, vector)
+        prompt = self._build_prompt(question, log_type, windchill_docs, http_docs)
+        tokens = (chunk.content for chunk in self.llm.stream(prompt))
+        return windchill_docs + http_docs, tokens
+    
+    def query_with_documents(self, question: str, windchill_docs, http_docs):
+        """Answer a combined-log question from documents that were already retrieved"""
+        try:
+            result, source_docs = self._answer_combined(question, windchill_docs, http_docs)
+            return {
+                "result": result.content,
+                "source_documents": source_docs,
+                "log_type": "combined"
+            }
+        except Exception as e:
+            return {
+                "result": f"Error processing query: {str(e)}",
+                "source_documents": [],
+                "log_type": "combined"
+            }
+    
+    def _answer_combined(self, question: str, windchill_docs, http_docs):
+        """Run the combined prompt over both document sets"""
+        prompt = self._build_prompt(question, "combined", windchill_docs, http_docs)
+        result = self.llm.invoke(prompt)
+        return result, windchill_docs + http_docs
+    
+    def _retrieve(self, question: str, log_type: str, vector=None):
+        """Fetch (windchill_docs, http_docs) for a log type, by text or by pre-computed embedding"""
+        if log_type == "combined":
+            windchill_docs, http_docs = self._retrieve_concurrently(question, vector)
+        elif log_type == "windchill":
+            windchill_docs, http_docs = self._search("windchill", question, vector), []
+        else:  # http logs
+            windchill_docs, http_docs = [], self._search("http", question, vector)
+        return windchill_docs, http_docs
+    
+    def _retrieve_concurrently(self, question: str, vector=None):
+        """Search both indexes at once; embedding RPCs and FAISS searches release the GIL"""
+        windchill_future = self.retrieval_pool.submit(self._search, "windchill", question, vector)
+        http_future = self.retrieval_pool.submit(self._search, "http", question, vector)
+        return windchill_future.result(), http_future.result()
+    
+    def _search(self, index_name: str, question: str, vector=None):
+        """Search the "windchill" or "http" index by text, or by pre-computed embedding when one is given"""
+        if vector is not None:
+            retriever = self.windchill_retriever if index_name == "windchill" else self.http_retriever
+            return retriever.vectorstore.similarity_search_by_vector(vector, **retriever.search_kwargs)
+        return list(self._cached_text_search(index_name, question))
+    
+    def _text_search(self, index_name: str, question: str):
+        """Uncached text search; returns a tuple so cached results can't be mutated by callers"""
+        retriever = self.windchill_retriever if index_name == "windchill" else self.http_retriever
+        return tuple(retriever.invoke(question))
+    
+    def _build_prompt(self, question: str, log_type: str, windchill_docs, http_docs):
+        """Fill the prompt template for a log type with the retrieved documents"""
+        if log_type == "combined":
+            # Each source gets half the budget so neither crowds the other out
+            return self.combined_prompt_format(
+                windchill_context=self._join_context(self._fit_budget(windchill_docs, CONTEXT_TOKEN_BUDGET // 2)),
+                http_context=self._join_context(self._fit_budget(http_docs, CONTEXT_TOKEN_BUDGET // 2)),
+                question=question
+            )
+        
+        if log_type == "windchill":
+            prompt_format, docs = self.windchill_prompt_format, windchill_docs
+        else:  # http logs
+            prompt_format, docs = self.http_prompt_format, http_docs
+        
+        return prompt_format(
+            context=self._join_context(self._fit_budget(docs, CONTEXT_TOKEN_BUDGET)),
+            question=question
+        )
+    
+    @staticmethod
+    def _fit_budget(docs, budget: int):
+        """Keep the top-ranked documents whose token counts fit within budget.
+        
+        Counts come from the "tok" metadata written at ingest; indexes built before that
+        fall back to a ~4 characters per token estimate.
+        """
+        kept, used = [], 0
+        for doc in docs:
+            tokens = doc.metadata.get("tok") or len(doc.page_content) // 4 + 1
+            if used + tokens > budget:
+                break
+            kept.append(doc)
+            used += tokens
+        return kept
+    
+    def _join_context(self, docs):
+        """Join document contents for a prompt, memoized on document identity.
+        
+        Cached retrieval returns the docstore's own Document objects, so a repeat question yields
+        the same objects; the cache entry keeps them alive so their ids can't be reused.
+        """
+        key = tuple(map(id, docs))
+        with self._context_lock:
+            entry = self._context_cache.get(key)
+            if entry is not None:
+                self._context_cache.move_to_end(key)
+                return entry[1]
+        
+        # str.join builds a list from any iterable, so a list comprehension is the cheaper input
+        entry = (tuple(docs), "\n\n".join([doc.page_content for doc in docs]))
+        with self._context_lock:
+            self._context_cache[key] = entry
+            while len(self._context_cache) > RETRIEVAL_CACHE_SIZE:
+                self._context_cache.popitem(last=False)
+        return entry[1]
+    
+    def batch_search(self, query_vectors, k: int = 5):
+        """Search both indexes for several pre-embedded queries with one FAISS call per index.
+        
+        Returns a list of (windchill_docs, http_docs) tuples, one per query vector.
+        """
+        matrix = np.asarray(query_vectors, dtype="float32")
+        windchill_hits = self._search_index(self.windchill_vector_store, matrix, k)
+        http_hits = self._search_index(self.http_vector_store, matrix, k)
+        return list(zip(windchill_hits, http_hits))
+    
+    @staticmethod
+    def _search_index(vector_store, matrix, k: int):
+        """Run a batched FAISS search and map the hits back to documents"""
+        _, indices = vector_store.index.search(matrix, k)
+        results = []
+        for row in indices:
+            docs = []
+            for i in row:
+                if i == -1:  # fewer than k vectors in the index
+                    continue
+                doc_id = vector_store.index_to_docstore_id[int(i)]
+                docs.append(vector_store.docstore.search(doc_id))
+            results.append(docs)
+        return results
+    
     def generate_remediation_report(self, question: str = "Generate comprehensive remediation report"):
         """Generate a detailed remediation report"""
         try:
-            # Get documents from both sources for comprehensive analysis
-            windchill_docs = self.windchill_retriever.get_relevant_documents(question)
-            http_docs = self.http_retriever.get_relevant_documents(question)
+            # Get documents from both sources for comprehensive analysis (searched concurrently)
+            windchill_docs, http_docs = self._retrieve_concurrently(question)
             
             all_docs = windchill_docs + http_docs
-            context = "\n\n".join([doc.page_content for doc in all_docs])
+            context = self._join_context(self._fit_budget(all_docs, CONTEXT_TOKEN_BUDGET))
             
             # Use remediation-specific prompt
-            prompt = self.remediation_prompt_template.format(
+            prompt = self.remediation_prompt_format(
                 context=context,
                 question=question
             )
@@ -0,0 +1,45 @@
+# rebuild_faiss_index.py
+import os
+import sys
+import faiss
+
+from config import *
+from faiss_index import convert_index
+
+def rebuild_index(folder_path: str) -> bool:
+    """Convert a saved flat or HNSW index to FAISS_INDEX_TYPE in place; index.pkl is untouched since ids keep their order."""
+    index_file = os.path.join(folder_path, "index.faiss")
+    if not os.path.exists(index_file):
+        print(f"⚠️ No index found at {index_file}")
+        return False
+
+    index = faiss.read_index(index_file)
+    # Flat and full-precision HNSW indexes can be reconstructed exactly; quantized ones can't
+    reconstructable = isinstance(index, faiss.IndexFlat) or (
+        isinstance(index, faiss.IndexHNSWFlat) and FAISS_INDEX_TYPE != "hnsw"
+    )
+    if not reconstructable:
+        print(f"✅ {folder_path} is already a {type(index).__name__} index, skipping")
+        return False
+
+    print(f"🔨 Rebuilding {folder_path}: {index.ntotal} vectors from {type(index).__name__}...")
+    new_index = convert_index(index)
+
+    # Write next to the old file and swap, so an interrupted rebuild leaves the original intact
+    tmp_file = index_file + ".tmp"
+    faiss.write_index(new_index, tmp_file)
+    os.replace(tmp_file, index_file)
+    print(f"💾 Saved {type(new_index).__name__} index to {index_file}")
+    return True
+
+def main():
+    """Rebuild the Windchill and HTTP indexes (or the folders given as arguments)."""
+    folders = sys.argv[1:] or [FAISS_INDEX_PATH, FAISS_HTTP_INDEX_PATH]
+    for folder in folders:
+        try:
+            rebuild_index(folder)
+        except Exception as e:
+            print(f"❌ Failed to rebuild {folder}: {e}")
+
+if __name__ == "__main__":
+    main()